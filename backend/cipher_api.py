@@ -3,10 +3,33 @@
 FastAPI server for Enhanced AVS Cipher with PBR Integration
 Exposes the encryption/decryption functionality via REST API
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import Response
+from pydantic import BaseModel, ValidationError
+from collections import OrderedDict
+import asyncio
 import base64
+import binascii
+import codecs
+import hashlib
+import json
+import os
+import time
+
+# Optional fast serializers; the API falls back to the stdlib encoder
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
 
 app = FastAPI(title="Enhanced AVS Cipher API", version="2.0.0")
 
@@ -19,6 +42,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# WebSocket session limits (override via environment variables)
+WS_MAX_SESSIONS = int(os.environ.get("AVS_WS_MAX_SESSIONS", "100"))
+WS_MAX_FRAMES_PER_SECOND = int(
+    os.environ.get("AVS_WS_MAX_FRAMES_PER_SECOND", "50"))
+WS_IDLE_TIMEOUT = float(os.environ.get("AVS_WS_IDLE_TIMEOUT", "60"))
+
+_active_ws_sessions = 0
+
+# Streaming pipeline chunk size; a multiple of 3 so base64 needs no padding
+STREAM_CHUNK_SIZE = 48 * 1024
+
+_B64_DELETE = bytes(
+    b for b in range(256)
+    if b not in b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=")
+
+# Compiled key schedules kept per worker process, keyed by
+# (SHA-256 of the passphrase, rounds). The schedules are derived byte-for-byte
+# from the passphrase (with rounds=1 they are its character codes), so the
+# cache holds secret material; set AVS_SCHEDULE_CACHE_SIZE=0 to disable it
+SCHEDULE_CACHE_SIZE = int(os.environ.get("AVS_SCHEDULE_CACHE_SIZE", "256"))
+
+_schedule_cache = OrderedDict()
+
 
 class EncryptRequest(BaseModel):
     plaintext: str
@@ -36,6 +82,13 @@ class DecryptRequest(BaseModel):
     block_size: int = 8
 
 
+class SessionStartRequest(BaseModel):
+    password: str
+    rounds: int = 3
+    use_pbr: bool = True
+    block_size: int = 8
+
+
 class EncryptResponse(BaseModel):
     success: bool
     ciphertext: str = ""
@@ -154,57 +207,329 @@ def decrypt_once_bytes(ct_bytes: bytes, key):
     return bytes(out)
 
 
-def encrypt_text(plaintext: str, passphrase: str, rounds: int = 3, use_pbr: bool = True, block_size: int = 8) -> str:
-    """Enhanced encryption combining AVS cipher with optional PBR techniques"""
-    data = plaintext.encode('utf-8')
+def compile_schedule(passphrase: str, rounds: int = 3):
+    """Fold all evolving round keys into one shift per key position.
+
+    Every round shifts byte i by key[i % len(key)] and all round keys share
+    the passphrase length, so the rounds add up to a single combined key.
+    """
     key = generate_key(passphrase)
+    schedule = [0] * len(key)
+    for _ in range(rounds):
+        schedule = [(s + k) % 256 for s, k in zip(schedule, key)]
+        key = evolve_key(key)
+    return schedule
+
+
+def cached_schedule(passphrase: str, rounds: int = 3):
+    """LRU-cached compile_schedule for repeated passphrase/rounds pairs"""
+    digest = hashlib.sha256(passphrase.encode('utf-8', errors='surrogatepass')).digest()
+    key = (digest, rounds)
+    schedule = _schedule_cache.get(key)
+    if schedule is not None:
+        _schedule_cache.move_to_end(key)
+        return schedule
+
+    schedule = tuple(compile_schedule(passphrase, rounds))
+    if SCHEDULE_CACHE_SIZE > 0:
+        _schedule_cache[key] = schedule
+        if len(_schedule_cache) > SCHEDULE_CACHE_SIZE:
+            _schedule_cache.popitem(last=False)
+    return schedule
+
+
+def rotate_key(key, offset: int):
+    """Rotate a position-indexed key so index 0 lines up with `offset`"""
+    offset %= len(key)
+    return list(key[offset:]) + list(key[:offset])
+
+
+def iter_text_chunks(text: str, size: int = STREAM_CHUNK_SIZE):
+    """Split text into UTF-8 encoded chunks without copying it whole"""
+    for i in range(0, len(text), size):
+        yield text[i:i+size].encode('utf-8')
+
+
+def b64encode_stream(chunks):
+    """Base64-encode byte chunks incrementally on 3-byte boundaries"""
+    pending = b""
+    for chunk in chunks:
+        data = pending + chunk
+        cut = len(data) - len(data) % 3
+        pending = data[cut:]
+        if cut:
+            yield base64.b64encode(data[:cut]).decode('ascii')
+    if pending:
+        yield base64.b64encode(pending).decode('ascii')
+
+
+def b64decode_stream(chunks):
+    """Base64-decode text chunks incrementally on 4-character boundaries.
+
+    Follows binascii's non-strict rules like base64.b64decode: characters
+    outside the alphabet are discarded, '=' counts as padding only at quad
+    position 2 or 3, and input after a complete padding group is ignored.
+    """
+    pending = b""
+    total = 0
+    pads = 0
+    done = False
+    for chunk in chunks:
+        data = chunk.encode('ascii').translate(None, _B64_DELETE)
+        if done:
+            continue
+
+        parts = []
+        start = 0
+        while True:
+            padding = data.find(b"=", start)
+            segment = data[start:] if padding < 0 else data[start:padding]
+            if segment:
+                parts.append(segment)
+                total += len(segment)
+                pads = 0
+            if padding < 0:
+                break
+            quad_pos = total % 4
+            if quad_pos >= 2:
+                pads += 1
+                if quad_pos + pads >= 4:
+                    done = True
+                    break
+            start = padding + 1
+
+        data = pending + b"".join(parts)
+        cut = len(data) - len(data) % 4
+        pending = data[cut:]
+        if cut:
+            yield base64.b64decode(data[:cut])
+
+    if pending:
+        if done:
+            yield base64.b64decode(pending + b"=" * (4 - len(pending)))
+        elif len(pending) == 1:
+            raise binascii.Error(
+                "Invalid base64-encoded string: number of data characters "
+                f"({total}) cannot be 1 more than a multiple of 4")
+        else:
+            raise binascii.Error("Incorrect padding")
+
+
+def shift_stream(chunks, key, shift_once):
+    """Apply a position-indexed shift (encrypt/decrypt_once_bytes) to chunks"""
+    pos = 0
+    for chunk in chunks:
+        if chunk:
+            yield shift_once(chunk, rotate_key(key, pos))
+            pos += len(chunk)
+
+
+def reverse_blocks(data: bytes, block_size: int):
+    return b"".join(data[i:i+block_size][::-1] for i in range(0, len(data), block_size))
+
+
+def pbr_encrypt_stream(chunks, keyword: str, block_size: int = 8):
+    """Streaming pbr_encrypt_bytes working on whole blocks"""
+    key = [ord(ch) for ch in keyword]
+    pending = b""
+    pos = 0
+    for chunk in chunks:
+        data = pending + chunk
+        cut = len(data) - len(data) % block_size
+        pending = data[cut:]
+        if cut:
+            yield reverse_blocks(encrypt_once_bytes(data[:cut], rotate_key(key, pos)), block_size)
+            pos += cut
+    if pending:
+        # Pad the final block with '~'
+        data = pending + b"~" * (block_size - len(pending))
+        yield reverse_blocks(encrypt_once_bytes(data, rotate_key(key, pos)), block_size)
+
+
+def pbr_decrypt_stream(chunks, keyword: str, block_size: int = 8):
+    """Streaming pbr_decrypt_bytes working on whole blocks.
+
+    Runs of trailing '~' are counted rather than emitted until a later byte
+    shows they are not padding.
+    """
+    key = [ord(ch) for ch in keyword]
+    pending = b""
+    pos = 0
+    tildes = 0
+
+    def unpad(data):
+        nonlocal tildes
+        stripped = data.rstrip(b"~")
+        if not stripped:
+            tildes += len(data)
+            return b""
+        out = b"~" * tildes + stripped
+        tildes = len(data) - len(stripped)
+        return out
+
+    for chunk in chunks:
+        data = pending + chunk
+        cut = len(data) - len(data) % block_size
+        pending = data[cut:]
+        if cut:
+            out = unpad(decrypt_once_bytes(reverse_blocks(data[:cut], block_size), rotate_key(key, pos)))
+            pos += cut
+            if out:
+                yield out
+    if pending:
+        out = unpad(decrypt_once_bytes(pending[::-1], rotate_key(key, pos)))
+        if out:
+            yield out
+
+
+def encrypt_stream(text_chunks, passphrase: str, schedule, use_pbr: bool = True, block_size: int = 8):
+    """Encrypt UTF-8 byte chunks into base64 token chunks with bounded memory"""
+    data = text_chunks
 
     # Apply PBR encryption first if enabled
     if use_pbr:
-        data = pbr_encrypt_bytes(data, passphrase, block_size)
-
-    # Apply multi-round AVS cipher encryption
-    for _ in range(rounds):
-        data = encrypt_once_bytes(data, key)
-        key = evolve_key(key)
+        data = pbr_encrypt_stream(data, passphrase, block_size)
 
-    return base64.b64encode(data).decode('ascii')
+    # Apply all AVS cipher rounds in a single pass
+    data = shift_stream(data, schedule, encrypt_once_bytes)
 
+    return b64encode_stream(data)
 
-def decrypt_text(b64cipher: str, passphrase: str, rounds: int = 3, use_pbr: bool = True, block_size: int = 8):
-    """Enhanced decryption combining AVS cipher with optional PBR techniques"""
-    try:
-        data = base64.b64decode(b64cipher)
-    except Exception as e:
-        return None, f"Base64 decode error: {e}"
 
-    # Build keys forward
-    key = generate_key(passphrase)
-    keys = [key]
-    for _ in range(rounds - 1):
-        key = evolve_key(key)
-        keys.append(key)
+def decrypt_stream(token_chunks, passphrase: str, schedule, use_pbr: bool = True, block_size: int = 8):
+    """Decrypt base64 token chunks into text chunks with bounded memory"""
+    data = b64decode_stream(token_chunks)
 
-    # Apply inverse AVS cipher in reverse order
-    for k in reversed(keys):
-        data = decrypt_once_bytes(data, k)
+    # Undo all AVS cipher rounds in a single pass
+    data = shift_stream(data, schedule, decrypt_once_bytes)
 
     # Apply PBR decryption if it was used during encryption
     if use_pbr:
-        try:
-            data = pbr_decrypt_bytes(data, passphrase, block_size)
-        except Exception as e:
-            return None, f"PBR decryption error: {e}"
+        data = pbr_decrypt_stream(data, passphrase, block_size)
+
+    # Replacement decoding matches a strict decode whenever the data is valid
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for chunk in data:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def encrypt_with_schedule(plaintext: str, passphrase: str, schedule, use_pbr: bool = True, block_size: int = 8) -> str:
+    """Encrypt using a schedule precomputed by compile_schedule"""
+    return "".join(encrypt_stream(
+        iter_text_chunks(plaintext), passphrase, schedule, use_pbr, block_size))
+
 
+def decrypt_with_schedule(b64cipher: str, passphrase: str, schedule, use_pbr: bool = True, block_size: int = 8):
+    """Decrypt using a schedule precomputed by compile_schedule"""
+    token_chunks = (b64cipher[i:i+STREAM_CHUNK_SIZE]
+                    for i in range(0, len(b64cipher), STREAM_CHUNK_SIZE))
     try:
-        text = data.decode('utf-8')
-    except Exception:
-        text = data.decode('utf-8', errors='replace')
+        text = "".join(decrypt_stream(
+            token_chunks, passphrase, schedule, use_pbr, block_size))
+    except (binascii.Error, ValueError) as e:
+        return None, f"Base64 decode error: {e}"
     return text, None
 
 
+def encrypt_text(plaintext: str, passphrase: str, rounds: int = 3, use_pbr: bool = True, block_size: int = 8) -> str:
+    """Enhanced encryption combining AVS cipher with optional PBR techniques"""
+    schedule = cached_schedule(passphrase, rounds)
+    return encrypt_with_schedule(plaintext, passphrase, schedule, use_pbr, block_size)
+
+
+def decrypt_text(b64cipher: str, passphrase: str, rounds: int = 3, use_pbr: bool = True, block_size: int = 8):
+    """Enhanced decryption combining AVS cipher with optional PBR techniques"""
+    schedule = cached_schedule(passphrase, rounds)
+    return decrypt_with_schedule(b64cipher, passphrase, schedule, use_pbr, block_size)
+
+
+def parse_accept(accept: str):
+    """Parse an Accept header into (media range, q) pairs"""
+    ranges = []
+    for part in accept.split(","):
+        media, *params = part.split(";")
+        media = media.strip().lower()
+        if not media:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    q = 0.0
+        ranges.append((media, q))
+    return ranges
+
+
+def accept_quality(ranges, media_type: str) -> float:
+    """q-value of media_type taken from its most specific matching range"""
+    wildcard = media_type.split("/")[0] + "/*"
+    best_specificity, best_q = -1, 0.0
+    for media, q in ranges:
+        if media == media_type:
+            specificity = 2
+        elif media == wildcard:
+            specificity = 1
+        elif media == "*/*":
+            specificity = 0
+        else:
+            continue
+        if specificity > best_specificity:
+            best_specificity, best_q = specificity, q
+    return best_q
+
+
+def negotiate_media_type(accept: str) -> str:
+    """Pick JSON or MessagePack from an Accept header; JSON wins ties"""
+    if not accept.strip():
+        return JSON_MEDIA_TYPE
+    ranges = parse_accept(accept)
+    best_type, best_q = JSON_MEDIA_TYPE, accept_quality(ranges, JSON_MEDIA_TYPE)
+    if msgpack is not None:
+        for media_type in MSGPACK_MEDIA_TYPES:
+            q = accept_quality(ranges, media_type)
+            if q > best_q:
+                best_type, best_q = media_type, q
+    return best_type
+
+
+def cipher_response(http_request: Request, payload: dict) -> Response:
+    """Serialize an endpoint payload in the format the client accepts.
+
+    Payloads are plain dicts shaped like EncryptResponse/DecryptResponse, so
+    returning a Response here skips FastAPI's response_model re-validation.
+    """
+    headers = {"Vary": "Accept"}
+    media_type = negotiate_media_type(http_request.headers.get("accept", ""))
+    if media_type != JSON_MEDIA_TYPE:
+        return Response(msgpack.packb(payload), media_type=media_type, headers=headers)
+    if orjson is not None:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return Response(body, media_type=JSON_MEDIA_TYPE, headers=headers)
+
+
+def session_parameter_error(request: SessionStartRequest):
+    """Return a validation error message for session parameters, if any"""
+    if not request.password.strip():
+        return "Password cannot be empty"
+    if request.rounds < 1:
+        return "Rounds must be at least 1"
+    if request.block_size < 1:
+        return "Block size must be at least 1"
+    return None
+
+
 @app.post("/encrypt", response_model=EncryptResponse)
-async def encrypt_endpoint(request: EncryptRequest):
+async def encrypt_endpoint(request: EncryptRequest, http_request: Request):
     try:
         if not request.plaintext.strip():
             raise HTTPException(
@@ -225,16 +550,18 @@ async def encrypt_endpoint(request: EncryptRequest):
         ciphertext = encrypt_text(
             request.plaintext, request.password, request.rounds,
             request.use_pbr, request.block_size)
-        return EncryptResponse(success=True, ciphertext=ciphertext)
+        return cipher_response(http_request, {
+            "success": True, "ciphertext": ciphertext, "error": ""})
 
     except HTTPException:
         raise
     except Exception as e:
-        return EncryptResponse(success=False, error=str(e))
+        return cipher_response(http_request, {
+            "success": False, "ciphertext": "", "error": str(e)})
 
 
 @app.post("/decrypt", response_model=DecryptResponse)
-async def decrypt_endpoint(request: DecryptRequest):
+async def decrypt_endpoint(request: DecryptRequest, http_request: Request):
     try:
         if not request.ciphertext.strip():
             raise HTTPException(
@@ -257,19 +584,146 @@ async def decrypt_endpoint(request: DecryptRequest):
             request.use_pbr, request.block_size)
 
         if error:
-            return DecryptResponse(success=False, error=error)
+            return cipher_response(http_request, {
+                "success": False, "plaintext": "", "error": error})
 
-        return DecryptResponse(success=True, plaintext=plaintext)
+        return cipher_response(http_request, {
+            "success": True, "plaintext": plaintext, "error": ""})
 
     except HTTPException:
         raise
     except Exception as e:
-        return DecryptResponse(success=False, error=str(e))
+        return cipher_response(http_request, {
+            "success": False, "plaintext": "", "error": str(e)})
+
+
+async def receive_frame(websocket: WebSocket):
+    """Receive one WebSocket frame; returns str for text, bytes for binary"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("text") is not None:
+        return message["text"]
+    return message.get("bytes") or b""
+
+
+@app.websocket("/ws")
+async def websocket_session(websocket: WebSocket):
+    """Streaming session: parameters once, then small encrypt/decrypt frames.
+
+    The first frame is a JSON object with password, rounds, use_pbr and
+    block_size. Each following frame is {"op": "encrypt"|"decrypt",
+    "text": ..., "id": optional} and is answered with the same fields as
+    the /encrypt or /decrypt responses, echoing op and id.
+    """
+    global _active_ws_sessions
+    if _active_ws_sessions >= WS_MAX_SESSIONS:
+        await websocket.close(code=1013)  # Try again later
+        return
+
+    _active_ws_sessions += 1
+    try:
+        await websocket.accept()
+
+        try:
+            raw = await asyncio.wait_for(receive_frame(websocket), WS_IDLE_TIMEOUT)
+            if not isinstance(raw, str):
+                raise ValueError("expected a text frame")
+            start = SessionStartRequest(**json.loads(raw))
+        except asyncio.TimeoutError:
+            await websocket.close(code=1001)
+            return
+        except (ValueError, TypeError, ValidationError) as e:
+            await websocket.send_json({"success": False, "error": f"Invalid session start: {e}"})
+            await websocket.close(code=1008)
+            return
+
+        error = session_parameter_error(start)
+        if error:
+            await websocket.send_json({"success": False, "error": error})
+            await websocket.close(code=1008)
+            return
+
+        # Compile the key schedule once for the whole session
+        schedule = cached_schedule(start.password, start.rounds)
+        await websocket.send_json({"success": True, "ready": True})
+
+        window_start = time.monotonic()
+        frames_in_window = 0
+        while True:
+            try:
+                raw = await asyncio.wait_for(receive_frame(websocket), WS_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                await websocket.close(code=1001)
+                return
+
+            # Parse first so every reply can echo op and id when present
+            try:
+                frame = json.loads(raw)
+            except ValueError:
+                frame = None
+            response = {}
+            if isinstance(frame, dict):
+                response["op"] = frame.get("op")
+                if "id" in frame:
+                    response["id"] = frame["id"]
+
+            now = time.monotonic()
+            if now - window_start >= 1.0:
+                window_start = now
+                frames_in_window = 0
+            frames_in_window += 1
+            if frames_in_window > WS_MAX_FRAMES_PER_SECOND:
+                response.update(success=False, error="Frame rate limit exceeded")
+                await websocket.send_json(response)
+                continue
+
+            if not isinstance(raw, str):
+                response.update(success=False, error="Frames must be text")
+                await websocket.send_json(response)
+                continue
+
+            if not isinstance(frame, dict):
+                response.update(success=False, error="Frame must be a JSON object")
+                await websocket.send_json(response)
+                continue
+
+            op = response["op"]
+            text = frame.get("text", "")
+
+            try:
+                if not isinstance(text, str) or not text.strip():
+                    response.update(success=False, error="Text cannot be empty")
+                elif op == "encrypt":
+                    response.update(success=True, ciphertext=encrypt_with_schedule(
+                        text, start.password, schedule, start.use_pbr, start.block_size))
+                elif op == "decrypt":
+                    plaintext, error = decrypt_with_schedule(
+                        text, start.password, schedule, start.use_pbr, start.block_size)
+                    if error:
+                        response.update(success=False, error=error)
+                    else:
+                        response.update(success=True, plaintext=plaintext)
+                else:
+                    response.update(success=False, error="Invalid operation")
+            except Exception as e:
+                response.update(success=False, error=str(e))
+
+            await websocket.send_json(response)
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _active_ws_sessions -= 1
 
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "message": "Enhanced AVS Cipher API is running"}
+    return {
+        "status": "healthy",
+        "message": "Enhanced AVS Cipher API is running",
+        "pid": os.getpid(),
+    }
 
 
 @app.get("/info")
@@ -282,7 +736,9 @@ async def get_cipher_info():
             "Polyalphabetic Block-Reverse (PBR) enhancement",
             "Configurable block sizes",
             "Base64 encoded output",
-            "Key evolution between rounds"
+            "Key evolution between rounds",
+            "WebSocket sessions with a once-per-session key schedule",
+            "JSON or MessagePack responses via the Accept header"
         ],
         "removed_features": [
             "Hardcoded 'Ammar' inclusion in key generation"
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Multi-worker launcher for the Enhanced AVS Cipher API
+- Starts N uvicorn worker processes serving cipher_api.py on local ports
+- Routes /encrypt and /decrypt by hash of (passphrase hash, rounds, block_size)
+  so repeated parameters keep hitting the same warm schedule cache, spilling
+  over to the least loaded worker when the preferred one is backed up
+- Restarts workers that exit and exposes per-worker load at /cluster/workers
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+STICKY_PATHS = ("/encrypt", "/decrypt")
+STATS_PATH = "/cluster/workers"
+READ_CHUNK = 65536
+NO_BODY_STATUSES = ("204", "304")
+PROBE_TIMEOUT = 2.0
+
+
+class WorkerUnavailable(Exception):
+    """Raised when a worker cannot be connected to"""
+
+
+class Worker:
+    """One uvicorn process plus the dispatcher's view of its load"""
+
+    def __init__(self, index: int, port: int):
+        self.index = index
+        self.port = port
+        self.process = None
+        self.ready = False
+        self.started_at = 0.0
+        self.restarts = 0
+        self.in_flight = 0
+        self.tunnels = 0
+        self.requests = 0
+        self.errors = 0
+        self.idle = []
+
+    def start(self):
+        backend_dir = os.path.dirname(os.path.abspath(__file__))
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "cipher_api:app",
+             "--host", "127.0.0.1", "--port", str(self.port),
+             "--log-level", "warning"],
+            cwd=backend_dir,
+        )
+        self.ready = False
+        self.started_at = time.monotonic()
+        self.idle = []
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stats(self):
+        return {
+            "index": self.index,
+            "port": self.port,
+            "pid": self.process.pid if self.process else None,
+            "alive": self.alive(),
+            "ready": self.ready,
+            "restarts": self.restarts,
+            "in_flight": self.in_flight,
+            "tunnels": self.tunnels,
+            "requests": self.requests,
+            "errors": self.errors,
+            "uptime_s": round(time.monotonic() - self.started_at, 1) if self.alive() else 0.0,
+        }
+
+    async def acquire(self):
+        """Return (reader, writer, reused), preferring a pooled connection"""
+        while self.idle:
+            reader, writer = self.idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+            return reader, writer, False
+        except OSError as e:
+            raise WorkerUnavailable(str(e)) from e
+
+    def release(self, reader, writer, keep_alive: bool):
+        if keep_alive and self.ready:
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+
+
+async def read_head(reader):
+    """Read a start line and headers; returns (raw head, start line, headers)"""
+    start = await reader.readline()
+    if not start:
+        return None
+    lines = [start]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed inside HTTP headers")
+        lines.append(line)
+        if line in (b"\r\n", b"\n"):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return b"".join(lines), start.decode("latin-1").strip(), headers
+
+
+async def read_body(reader, headers, until_eof: bool = False):
+    """Read a message body and return it with its original framing"""
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        parts = []
+        while True:
+            size_line = await reader.readline()
+            parts.append(size_line)
+            size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+            if size == 0:
+                # Trailers end with an empty line
+                while True:
+                    line = await reader.readline()
+                    parts.append(line)
+                    if line in (b"\r\n", b"\n", b""):
+                        return b"".join(parts)
+            parts.append(await reader.readexactly(size + 2))
+    if "content-length" in headers:
+        return await reader.readexactly(int(headers["content-length"]))
+    if until_eof:
+        return await reader.read()
+    return b""
+
+
+def response_has_body(method: str, status: str) -> bool:
+    return method != "HEAD" and not status.startswith("1") and status not in NO_BODY_STATUSES
+
+
+def wants_close(start_line: str, headers) -> bool:
+    connection = headers.get("connection", "").lower()
+    return "close" in connection or start_line.endswith("HTTP/1.0") or start_line.startswith("HTTP/1.0")
+
+
+def simple_response(status: str, payload: dict, close: bool = False) -> bytes:
+    body = json.dumps(payload).encode("utf-8")
+    head = (f"HTTP/1.1 {status}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n")
+    return head.encode("latin-1") + body
+
+
+class Dispatcher:
+    """Local HTTP front end that pins parameter sets to workers"""
+
+    def __init__(self, workers, restart_delay: float, request_timeout: float, spill_threshold: int):
+        self.workers = workers
+        self.restart_delay = restart_delay
+        self.request_timeout = request_timeout
+        self.spill_threshold = spill_threshold
+
+    def affinity_key(self, body: bytes):
+        """Stable hash of (passphrase hash, rounds, block_size), or None"""
+        try:
+            data = json.loads(body)
+            password = data["password"]
+            rounds = int(data.get("rounds", 3))
+            block_size = int(data.get("block_size", 8))
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return None
+        passphrase_hash = hashlib.sha256(str(password).encode("utf-8")).digest()
+        digest = hashlib.sha256(
+            passphrase_hash + f":{rounds}:{block_size}".encode("ascii")).digest()
+        return int.from_bytes(digest[:8], "big")
+
+    def pick(self, key=None, tunnel: bool = False):
+        ready = [w for w in self.workers if w.ready]
+        if not ready:
+            return None
+        if tunnel:
+            # Long-lived WebSocket tunnels are balanced on their own count
+            return min(ready, key=lambda w: (w.tunnels, w.in_flight))
+        least_loaded = min(ready, key=lambda w: w.in_flight)
+        if key is None:
+            return least_loaded
+        # Walk from the preferred slot so a down worker only moves its own keys
+        count = len(self.workers)
+        for step in range(count):
+            worker = self.workers[(key + step) % count]
+            if worker.ready:
+                break
+        # Spill a hot parameter set over to an idler worker rather than queue
+        if worker.in_flight - least_loaded.in_flight > self.spill_threshold:
+            return least_loaded
+        return worker
+
+    async def supervise(self):
+        """Probe new workers until healthy and restart any that exit"""
+        while True:
+            for worker in self.workers:
+                if not worker.alive():
+                    if worker.process is not None:
+                        print(f"Worker {worker.index} (pid {worker.process.pid}) exited "
+                              f"with {worker.process.returncode}; restarting", file=sys.stderr)
+                        worker.restarts += 1
+                        for _, writer in worker.idle:
+                            writer.close()
+                        await asyncio.sleep(self.restart_delay)
+                    worker.start()
+                elif not worker.ready:
+                    worker.ready = await self.probe(worker)
+            await asyncio.sleep(0.2)
+
+    async def probe(self, worker):
+        try:
+            return await asyncio.wait_for(self._probe(worker), PROBE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+
+    async def _probe(self, worker):
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", worker.port)
+        except OSError:
+            return False
+        try:
+            writer.write(b"GET /health HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            head = await read_head(reader)
+            return head is not None and head[1].split(" ")[1] == "200"
+        except (OSError, IndexError, asyncio.IncompleteReadError):
+            return False
+        finally:
+            writer.close()
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                head = await read_head(reader)
+                if head is None:
+                    break
+                raw_head, start_line, headers = head
+                if "websocket" in headers.get("upgrade", "").lower():
+                    await self.tunnel(raw_head, reader, writer)
+                    break
+
+                body = await read_body(reader, headers)
+                close = wants_close(start_line, headers)
+                parts = start_line.split(" ")
+                method = parts[0].upper()
+                path = parts[1].split("?", 1)[0] if len(parts) > 1 else ""
+
+                if path == STATS_PATH:
+                    writer.write(simple_response(
+                        "200 OK", {"workers": [w.stats() for w in self.workers]}, close))
+                else:
+                    key = self.affinity_key(body) if path in STICKY_PATHS else None
+                    writer.write(await self.forward(key, method, raw_head + body, close))
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def forward(self, key, method: str, request: bytes, close: bool) -> bytes:
+        # A worker that refuses the connection never saw the request, so move on
+        for _ in range(len(self.workers)):
+            worker = self.pick(key)
+            if worker is None:
+                break
+            worker.in_flight += 1
+            worker.requests += 1
+            try:
+                return await asyncio.wait_for(
+                    self.exchange(worker, method, request), self.request_timeout)
+            except WorkerUnavailable:
+                worker.errors += 1
+                worker.ready = False
+            except asyncio.TimeoutError:
+                worker.errors += 1
+                return simple_response("504 Gateway Timeout",
+                                       {"success": False, "error": f"Worker {worker.index} timed out"}, close)
+            except (OSError, IndexError, ValueError, asyncio.IncompleteReadError):
+                worker.errors += 1
+                return simple_response("502 Bad Gateway",
+                                       {"success": False, "error": f"Worker {worker.index} unavailable"}, close)
+            finally:
+                worker.in_flight -= 1
+        return simple_response("503 Service Unavailable",
+                               {"success": False, "error": "No workers ready"}, close)
+
+    async def exchange(self, worker, method: str, request: bytes) -> bytes:
+        """Send one request to a worker and return the raw response"""
+        for _ in range(2):
+            upstream_reader, upstream_writer, reused = await worker.acquire()
+            try:
+                try:
+                    upstream_writer.write(request)
+                    await upstream_writer.drain()
+                    head = await read_head(upstream_reader)
+                except ConnectionError:
+                    head = None
+                if head is None:
+                    upstream_writer.close()
+                    if reused:
+                        # Stale keep-alive socket; retry on a fresh connection
+                        continue
+                    raise ConnectionError("Worker closed the connection")
+
+                raw_head, start_line, headers = head
+                status = start_line.split(" ")[1]
+                # Relay interim responses (e.g. 100 Continue) ahead of the final one
+                while status.startswith("1") and status != "101":
+                    head = await read_head(upstream_reader)
+                    if head is None:
+                        raise ConnectionError("Worker closed the connection")
+                    raw_head += head[0]
+                    start_line, headers = head[1], head[2]
+                    status = start_line.split(" ")[1]
+                body = b""
+                if response_has_body(method, status):
+                    body = await read_body(upstream_reader, headers, until_eof=True)
+            except BaseException:
+                upstream_writer.close()
+                raise
+            worker.release(upstream_reader, upstream_writer,
+                           not wants_close(start_line, headers))
+            if status.startswith("5"):
+                worker.errors += 1
+            return raw_head + body
+        raise ConnectionError("Worker closed the connection")
+
+    async def tunnel(self, raw_head: bytes, reader, writer):
+        """Pipe a WebSocket upgrade to the worker with the fewest tunnels"""
+        # Tunnels are tracked apart from in_flight so idle sessions do not
+        # trigger spill-over of that worker's HTTP parameter sets
+        attempted = False
+        for _ in range(len(self.workers)):
+            worker = self.pick(tunnel=True)
+            if worker is None:
+                break
+            attempted = True
+            worker.requests += 1
+            try:
+                upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", worker.port)
+                break
+            except OSError:
+                worker.errors += 1
+                worker.ready = False
+        else:
+            worker = None
+        if worker is None:
+            if attempted:
+                response = simple_response("502 Bad Gateway",
+                                           {"success": False, "error": "Workers unavailable"}, True)
+            else:
+                response = simple_response("503 Service Unavailable",
+                                           {"success": False, "error": "No workers ready"}, True)
+            writer.write(response)
+            await writer.drain()
+            return
+
+        async def pipe(src, dst):
+            try:
+                while True:
+                    data = await src.read(READ_CHUNK)
+                    if not data:
+                        break
+                    dst.write(data)
+                    await dst.drain()
+            except ConnectionError:
+                pass
+            finally:
+                dst.close()
+
+        worker.tunnels += 1
+        try:
+            upstream_writer.write(raw_head)
+            await upstream_writer.drain()
+            await asyncio.gather(pipe(reader, upstream_writer), pipe(upstream_reader, writer))
+        finally:
+            worker.tunnels -= 1
+
+
+async def serve(args):
+    workers = [Worker(i, args.base_port + i) for i in range(args.workers)]
+    dispatcher = Dispatcher(workers, args.restart_delay, args.request_timeout, args.spill_threshold)
+    server = await asyncio.start_server(dispatcher.handle_client, args.host, args.port)
+    supervisor = asyncio.create_task(dispatcher.supervise())
+    print(f"Dispatching {args.host}:{args.port} to {args.workers} workers "
+          f"on ports {args.base_port}-{args.base_port + args.workers - 1}", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        supervisor.cancel()
+        for worker in workers:
+            if worker.alive():
+                worker.process.terminate()
+        for worker in workers:
+            if worker.process is not None:
+                worker.process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run several cipher_api workers behind a parameter-affinity dispatcher")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2,
+                        help="Number of uvicorn worker processes (default: CPU count)")
+    parser.add_argument("--host", default="0.0.0.0",
+                        help="Dispatcher bind address (default: 0.0.0.0)")
+    parser.add_argument("--port", type=int, default=8000,
+                        help="Dispatcher port (default: 8000)")
+    parser.add_argument("--base-port", type=int, default=8100,
+                        help="First local port used by workers (default: 8100)")
+    parser.add_argument("--restart-delay", type=float, default=1.0,
+                        help="Seconds to wait before restarting a failed worker (default: 1)")
+    parser.add_argument("--request-timeout", type=float, default=30.0,
+                        help="Seconds to wait for a worker's response (default: 30)")
+    parser.add_argument("--spill-threshold", type=int, default=4,
+                        help="Send a request to the least loaded worker when its preferred "
+                             "worker has more than this many extra in-flight requests (default: 4)")
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
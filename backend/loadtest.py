@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Local load-testing harness for the Enhanced AVS Cipher API
+- Launches cipher_api.py under a single uvicorn worker (or targets --url)
+- Sweeps concurrency, payload size, rounds and use_pbr against /encrypt
+- Reports throughput, p50/p95/p99/max latency and error rate as JSON
+  (latency of successful requests; failed ones are summarised separately)
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+# Pause after a connection error so clients do not spin against a dead server
+ERROR_BACKOFF = 0.1
+
+
+def parse_int_list(value: str):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def parse_bool_list(value: str):
+    return [v.strip().lower() in ("1", "true", "yes", "y") for v in value.split(",") if v.strip()]
+
+
+def percentile(sorted_values, pct: float):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def latency_summary(latencies):
+    latencies = sorted(latencies)
+    return {
+        "p50": round(percentile(latencies, 50), 3),
+        "p95": round(percentile(latencies, 95), 3),
+        "p99": round(percentile(latencies, 99), 3),
+        "max": round(latencies[-1], 3) if latencies else 0.0,
+    }
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def launch_server(port: int):
+    """Start cipher_api under one uvicorn worker and return the process"""
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "cipher_api:app",
+         "--host", "127.0.0.1", "--port", str(port),
+         "--workers", "1", "--log-level", "warning"],
+        cwd=backend_dir,
+    )
+
+
+async def wait_for_health(host: str, port: int, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = HTTPConnection(host, port)
+            status, _ = await conn.request("GET", "/health")
+            await conn.close()
+            if status == 200:
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f"API did not become healthy on {host}:{port}")
+
+
+class HTTPConnection:
+    """Minimal keep-alive HTTP/1.1 client on asyncio streams"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method: str, path: str, body: bytes = b""):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        head = (f"{method} {path} HTTP/1.1\r\n"
+                f"Host: {self.host}:{self.port}\r\n"
+                "Content-Type: application/json\r\n"
+                "Accept: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n")
+        self.writer.write(head.encode("ascii") + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            await self.close()
+            raise ConnectionError("Connection closed by server")
+        version, status = status_line.decode("latin-1").split(" ", 2)[:2]
+
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            data = await self.read_chunked()
+        elif "content-length" in headers:
+            data = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            # Without framing the body runs until the server closes
+            data = await self.reader.read()
+            headers["connection"] = "close"
+
+        if headers.get("connection", "").lower() == "close" or version == "HTTP/1.0":
+            await self.close()
+        return int(status), data
+
+    async def read_chunked(self):
+        parts = []
+        while True:
+            size_line = await self.reader.readline()
+            if not size_line:
+                raise ConnectionError("Connection closed inside chunked body")
+            size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+            if size == 0:
+                # Skip trailers up to the terminating empty line
+                while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(parts)
+            parts.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = None
+        self.writer = None
+
+
+async def run_scenario(host: str, port: int, concurrency: int, payload_size: int,
+                       rounds: int, use_pbr: bool, block_size: int, duration: float):
+    """Drive /encrypt from `concurrency` clients for `duration` seconds"""
+    body = json.dumps({
+        "plaintext": "x" * payload_size,
+        "password": "loadtest-passphrase",
+        "rounds": rounds,
+        "use_pbr": use_pbr,
+        "block_size": block_size,
+    }).encode("utf-8")
+    latencies = []
+    error_latencies = []
+
+    async def client(deadline: float):
+        conn = HTTPConnection(host, port)
+        try:
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                backoff = False
+                try:
+                    status, data = await conn.request("POST", "/encrypt", body)
+                    ok = status == 200 and json.loads(data).get("success") is True
+                except (OSError, asyncio.IncompleteReadError):
+                    await conn.close()
+                    ok = False
+                    backoff = True
+                except ValueError:
+                    await conn.close()
+                    ok = False
+                elapsed_ms = (time.perf_counter() - started) * 1000.0
+                (latencies if ok else error_latencies).append(elapsed_ms)
+                if backoff:
+                    await asyncio.sleep(ERROR_BACKOFF)
+        finally:
+            await conn.close()
+
+    started = time.perf_counter()
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(client(deadline) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    errors = len(error_latencies)
+    total = len(latencies) + errors
+    return {
+        "concurrency": concurrency,
+        "payload_size": payload_size,
+        "rounds": rounds,
+        "use_pbr": use_pbr,
+        "block_size": block_size,
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 6) if total else 0.0,
+        "throughput_rps": round((total - errors) / elapsed, 2) if elapsed else 0.0,
+        # Failed requests often return early, so they are summarised apart
+        "latency_ms": latency_summary(latencies),
+        "error_latency_ms": latency_summary(error_latencies),
+    }
+
+
+async def run_sweep(args, host: str, port: int):
+    await wait_for_health(host, port)
+    scenarios = []
+    for use_pbr in args.use_pbr:
+        for rounds in args.rounds:
+            for payload_size in args.payload_sizes:
+                for concurrency in args.concurrency:
+                    if args.warmup > 0:
+                        await run_scenario(host, port, concurrency, payload_size, rounds,
+                                           use_pbr, args.block_size, args.warmup)
+                    result = await run_scenario(host, port, concurrency, payload_size, rounds,
+                                                use_pbr, args.block_size, args.duration)
+                    print(
+                        f"c={concurrency:<4} size={payload_size:<6} rounds={rounds:<2} pbr={'y' if use_pbr else 'n'}  "
+                        f"{result['throughput_rps']:>9.1f} req/s  p50={result['latency_ms']['p50']:.2f}ms  "
+                        f"p99={result['latency_ms']['p99']:.2f}ms  errors={result['errors']}",
+                        file=sys.stderr)
+                    scenarios.append(result)
+    return scenarios
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load-test the Enhanced AVS Cipher API and write a JSON report")
+    parser.add_argument("--url", default="",
+                        help="Target an already running server instead of launching one")
+    parser.add_argument("--concurrency", type=parse_int_list, default=[1, 8, 32],
+                        help="Comma-separated client counts (default: 1,8,32)")
+    parser.add_argument("--payload-sizes", type=parse_int_list, default=[16, 256, 4096],
+                        help="Comma-separated plaintext sizes in bytes (default: 16,256,4096)")
+    parser.add_argument("--rounds", type=parse_int_list, default=[3],
+                        help="Comma-separated round counts (default: 3)")
+    parser.add_argument("--use-pbr", type=parse_bool_list, default=[True, False],
+                        help="Comma-separated use_pbr values (default: true,false)")
+    parser.add_argument("--block-size", type=int, default=8,
+                        help="PBR block size (default: 8)")
+    parser.add_argument("--duration", type=float, default=5.0,
+                        help="Seconds to measure each scenario (default: 5)")
+    parser.add_argument("--warmup", type=float, default=1.0,
+                        help="Unmeasured seconds before each scenario (default: 1)")
+    parser.add_argument("--output", default="",
+                        help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        target = urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+    else:
+        host, port = "127.0.0.1", free_port()
+        server = launch_server(port)
+
+    try:
+        scenarios = asyncio.run(run_sweep(args, host, port))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "target": args.url or "local uvicorn (1 worker)",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "duration_s": args.duration,
+        "warmup_s": args.warmup,
+        "scenarios": scenarios,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Tests for the chunked encrypt/decrypt pipeline in cipher_api.py
+Run from this directory with: python -m pytest test_streaming.py
+"""
+import base64
+import binascii
+import hashlib
+import itertools
+import random
+import tracemalloc
+
+import pytest
+
+from cipher_api import (b64decode_stream, compile_schedule, decrypt_stream,
+                        decrypt_text, encrypt_stream, encrypt_text)
+
+CHUNK_SIZE = 16 * 1024
+CHUNK_COUNT = 96
+MEMORY_BUDGET = 1024 * 1024
+
+
+def split_randomly(data, rng, max_size=9):
+    i = 0
+    while i < len(data):
+        size = rng.randint(1, max_size)
+        yield data[i:i+size]
+        i += size
+
+
+# A stray '=' before any data is discarded, and must not stall decoding
+@pytest.mark.parametrize("token_prefix", ["", "="])
+def test_stream_round_trip_stays_within_memory_budget(token_prefix):
+    passphrase = "stream-passphrase"
+    schedule = compile_schedule(passphrase, 3)
+    chunk = ("héllo~wörld " * (CHUNK_SIZE // 12 + 1))[:CHUNK_SIZE]
+
+    def text_chunks():
+        for _ in range(CHUNK_COUNT):
+            yield chunk.encode("utf-8")
+
+    expected = hashlib.sha256()
+    for data in text_chunks():
+        expected.update(data)
+
+    tracemalloc.start()
+    try:
+        tokens = itertools.chain(
+            [token_prefix], encrypt_stream(text_chunks(), passphrase, schedule, True, 8))
+        decrypted = 0
+        digest = hashlib.sha256()
+        for text in decrypt_stream(tokens, passphrase, schedule, True, 8):
+            digest.update(text.encode("utf-8"))
+            decrypted += len(text)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert decrypted == CHUNK_SIZE * CHUNK_COUNT
+    assert digest.hexdigest() == expected.hexdigest()
+    assert CHUNK_SIZE * CHUNK_COUNT > MEMORY_BUDGET
+    assert peak < MEMORY_BUDGET
+
+
+def test_stream_matches_whole_text_across_chunk_splits():
+    rng = random.Random(1234)
+    alphabet = ["a", "~", "é", "漢", "\x00", "😀", "~~"]
+    for _ in range(300):
+        plaintext = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 60)))
+        passphrase = "".join(chr(rng.randint(33, 500)) for _ in range(rng.randint(1, 12)))
+        rounds = rng.randint(1, 6)
+        use_pbr = rng.random() < 0.6
+        block_size = rng.randint(1, 10)
+        schedule = compile_schedule(passphrase, rounds)
+
+        token = encrypt_text(plaintext, passphrase, rounds, use_pbr, block_size)
+        text_chunks = (piece.encode("utf-8") for piece in split_randomly(plaintext, rng))
+        streamed = "".join(encrypt_stream(text_chunks, passphrase, schedule, use_pbr, block_size))
+        assert streamed == token
+
+        expected, error = decrypt_text(token, passphrase, rounds, use_pbr, block_size)
+        assert error is None
+        streamed = "".join(decrypt_stream(
+            split_randomly(token, rng), passphrase, schedule, use_pbr, block_size))
+        assert streamed == expected
+
+
+def test_b64decode_stream_matches_b64decode():
+    rng = random.Random(99)
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+    for _ in range(5000):
+        token = "".join(rng.choice(alphabet + "==\n !") for _ in range(rng.randint(0, 30)))
+        try:
+            expected = base64.b64decode(token)
+        except binascii.Error as e:
+            expected = str(e)
+        try:
+            streamed = b"".join(b64decode_stream(split_randomly(token, rng, 6)))
+        except binascii.Error as e:
+            streamed = str(e)
+        assert streamed == expected, token